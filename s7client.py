@@ -29,7 +29,8 @@ def parse_datetime(data):
     hour = bcd_to_int(data[3])
     minute = bcd_to_int(data[4])
     second = bcd_to_int(data[5])
-    ms = bcd_to_int(data[6]) * 10 + bcd_to_int(data[7])
+    # Byte 7: ms units in the high nibble, weekday in the low nibble
+    ms = bcd_to_int(data[6]) * 10 + (data[7] >> 4)
     return f"20{year:02d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}.{ms:03d}"
 
 
@@ -1,10 +1,10 @@
-
 import os
 import json
 import logging
 import sys
 import threading
 import time
+import datetime
 import random
 import ctypes
 import struct
@@ -18,20 +18,30 @@ def get_config_param(key, env_key, cfg, default):
     return os.environ.get(env_key) or cfg.get(key) or default
 
 
+def find_default_file(file_name):
+    # First check current working directory, then script directory
+    for path in [os.getcwd(), os.path.dirname(os.path.abspath(__file__))]:
+        default_path = os.path.join(path, file_name)
+        if os.path.exists(default_path):
+            return default_path
+    return None
+
+
 def load_s7_classic_config(config_path=None):
     if config_path:
-        if os.path.exists(config_path):
-            with open(config_path, "r") as f:
-                return json.load(f)
-        else:
+        if not os.path.exists(config_path):
             raise RuntimeError(f"Config file not found: {config_path}")
-    # First check current working directory, then script directory
-    for path in [os.getcwd(), os.path.dirname(__file__)]:
-        default_path = os.path.join(path, "s7_classic_connection.json")
-        if os.path.exists(default_path):
-            with open(default_path, "r") as f:
-                return json.load(f)
-    return {}
+    else:
+        config_path = find_default_file("s7_classic_connection.json")
+        if not config_path:
+            return {}
+    with open(config_path, "r") as f:
+        return json.load(f)
+
+
+def get_connection(s7_cfg):
+    connections = s7_cfg.get("configs", [{}])[0].get("config", {}).get("connections", [])
+    return connections[0] if connections else {}
 
 
 # Parse configuration file, support -f <config_path>
@@ -42,21 +52,7 @@ def parse_args():
     args, unknown = parser.parse_known_args()
     return args
 
-args = parse_args()
-s7_cfg = load_s7_classic_config(args.config_path)
-connections = s7_cfg.get("configs", [{}])[0].get("config", {}).get("connections", [])
-if not connections:
-    raise RuntimeError("No connections found in s7_classic_connection.json")
-conn = connections[0]
-params = conn.get("parameters", {})
-datapoints = conn.get("datapoints", [])
-
-# Parameter priority: Environment variable > Config file > Default value
-ADDRESS = get_config_param("ip_address", "S7SERVER_ADDRESS", params, "0.0.0.0")
-PORT = int(get_config_param("port", "S7SERVER_PORT", params, 102))
-RACK = int(get_config_param("rack_number", "S7SERVER_RACK", params, 0))
-SLOT = int(get_config_param("slot_number", "S7SERVER_SLOT", params, 2))
-FREQUENCY = float(get_config_param("frequency", "S7SERVER_FREQUENCY", params, 1))
+
 DB_NUMBER = 1
 
 # Calculate DB area size: find max offset + type length for all datapoints
@@ -79,23 +75,45 @@ def parse_offset(addr_str):
     _, _, byte_offset, _ = parse_address(addr_str)
     return byte_offset
 
+
+def datapoint_size(area_type, data_type):
+    if area_type == "DBX":
+        return 1
+    elif area_type == "DBW":
+        return 2
+    elif area_type == "DBD":
+        return 4
+    return TYPE_SIZE.get(data_type, 1)
+
+
+# 计算DB区大小，支持DBX/DBB/DBW/DBD
+def calc_db_size(datapoints):
+    max_offset = 0
+    for dp in datapoints:
+        _, area_type, byte_offset, _ = parse_address(dp["address"]["address_string"])
+        max_offset = max(max_offset, byte_offset + datapoint_size(area_type, dp["data_type"]))
+    return max(256, max_offset)
+
 # ---------------------- Logging Configuration ----------------------
 
-LOG_DEST = os.environ.get("S7SERVER_LOG", "stdout")
 logger = logging.getLogger("s7server")
-logger.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
-if LOG_DEST == "stdout":
-    handler = logging.StreamHandler(sys.stdout)
-elif LOG_DEST == "stderr":
-    handler = logging.StreamHandler(sys.stderr)
-else:
-    handler = logging.FileHandler(LOG_DEST)
-handler.setFormatter(formatter)
-# Remove old handlers to avoid duplication
-logger.handlers.clear()
-logger.addHandler(handler)
-logger.info(f"log output to: {LOG_DEST}")
+
+
+def setup_logging():
+    log_dest = os.environ.get("S7SERVER_LOG", "stdout")
+    logger.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+    if log_dest == "stdout":
+        handler = logging.StreamHandler(sys.stdout)
+    elif log_dest == "stderr":
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        handler = logging.FileHandler(log_dest)
+    handler.setFormatter(formatter)
+    # Remove old handlers to avoid duplication
+    logger.handlers.clear()
+    logger.addHandler(handler)
+    logger.info(f"log output to: {log_dest}")
 
 
 # ANSI color codes (same as client)
@@ -107,32 +125,40 @@ COLOR_STRING = '\033[95m'   # Magenta
 COLOR_DATETIME = '\033[91m' # Red
 COLOR_RESET = '\033[0m'     # Reset
 
-# 计算DB区大小，支持DBX/DBB/DBW/DBD
-max_offset = 0
-for dp in datapoints:
-    _, area_type, byte_offset, _ = parse_address(dp["address"]["address_string"])
-    if area_type == "DBX":
-        size = 1
-    elif area_type == "DBW":
-        size = 2
-    elif area_type == "DBD":
-        size = 4
-    else:
-        size = TYPE_SIZE.get(dp["data_type"], 1)
-    max_offset = max(max_offset, byte_offset + size)
-DB_SIZE = max(256, max_offset)
+# ---------------------- S7 Encoding ----------------------
+def int_to_bcd(val):
+    return ((val // 10) << 4) | (val % 10)
 
 
-# ---------------------- S7 Server Initialization ----------------------
-server = Server()
-db_buffer = ctypes.create_string_buffer(DB_SIZE)
-server.register_area(SrvArea.DB, DB_NUMBER, db_buffer)
+def encode_string(s):
+    b = s.encode('ascii')
+    max_len = 18  # S7 standard string max content length
+    actual_len = min(len(b), max_len)
+    buf = bytearray(20)
+    buf[0] = max_len
+    buf[1] = actual_len
+    buf[2:2+actual_len] = b[:actual_len]
+    return bytes(buf)
+
+
+def encode_datetime(dt):
+    # S7 DATE_AND_TIME: BCD year..second, ms in byte 6 and the high nibble
+    # of byte 7, weekday (1 = Sunday) in the low nibble of byte 7
+    ms = dt.microsecond // 1000
+    weekday = dt.isoweekday() % 7 + 1
+    return bytes([
+        int_to_bcd(dt.year % 100),
+        int_to_bcd(dt.month),
+        int_to_bcd(dt.day),
+        int_to_bcd(dt.hour),
+        int_to_bcd(dt.minute),
+        int_to_bcd(dt.second),
+        int_to_bcd(ms // 10),
+        ((ms % 10) << 4) | weekday,
+    ])
 
 # ---------------------- Data Writing Threads ----------------------
-def int_to_bcd(val):
-    return ((val // 10) << 4) | (val % 10)
-
-def write_bool_points(points):
+def write_bool_points(points, db_buffer, frequency):
     value = True
     while True:
         value = not value
@@ -147,9 +173,9 @@ def write_bool_points(points):
             else:
                 db_buffer[offset] = 0
             logger.info(f"{COLOR_BOOL}Wrote bool: {value} to {dp['address']['address_string']}{COLOR_RESET}")
-        time.sleep(FREQUENCY)
+        time.sleep(frequency)
 
-def write_int_points(points):
+def write_int_points(points, db_buffer, frequency):
     while True:
         written_offsets = set()
         for dp in points:
@@ -160,9 +186,9 @@ def write_int_points(points):
             value = random.randint(0, 65535)
             db_buffer[offset:offset+2] = value.to_bytes(2, byteorder='big')
             logger.info(f"{COLOR_INT}Wrote int: {value} to {dp['address']['address_string']}{COLOR_RESET}")
-        time.sleep(FREQUENCY)
+        time.sleep(frequency)
 
-def write_real_points(points):
+def write_real_points(points, db_buffer, frequency):
     while True:
         written_offsets = set()
         for dp in points:
@@ -173,10 +199,10 @@ def write_real_points(points):
             value = random.uniform(0, 100)
             db_buffer[offset:offset+4] = struct.pack('>f', value)
             logger.info(f"{COLOR_FLOAT}Wrote real: {value:.2f} to {dp['address']['address_string']}{COLOR_RESET}")
-        time.sleep(FREQUENCY)
+        time.sleep(frequency)
 
 # 单独定义写string类型的线程函数
-def write_string_points(points):
+def write_string_points(points, db_buffer, frequency):
     while True:
         written_offsets = set()
         for dp in points:
@@ -185,18 +211,11 @@ def write_string_points(points):
                 continue
             written_offsets.add(offset)
             s = f"Hello_{random.randint(100,999)}"
-            b = s.encode('ascii')
-            max_len = 18  # S7 standard string max content length
-            actual_len = min(len(b), max_len)
-            buf = bytearray(20)
-            buf[0] = max_len
-            buf[1] = actual_len
-            buf[2:2+actual_len] = b[:actual_len]
-            db_buffer[offset:offset+20] = buf
+            db_buffer[offset:offset+20] = encode_string(s)
             logger.info(f"{COLOR_STRING}Wrote string: {s} to {dp['address']['address_string']}{COLOR_RESET}")
-        time.sleep(FREQUENCY)
+        time.sleep(frequency)
 
-def write_datetime_points(points):
+def write_datetime_points(points, db_buffer, frequency):
     while True:
         written_offsets = set()
         for dp in points:
@@ -204,31 +223,13 @@ def write_datetime_points(points):
             if offset in written_offsets:
                 continue
             written_offsets.add(offset)
-            now = time.localtime()
-            year = now.tm_year % 100
-            month = now.tm_mon
-            day = now.tm_mday
-            hour = now.tm_hour
-            minute = now.tm_min
-            second = now.tm_sec
-            ms = int((time.time() % 1) * 1000)
-            ms_high = int_to_bcd(ms // 10)
-            ms_low = int_to_bcd(ms % 10)
-            dt_bytes = bytearray(8)
-            dt_bytes[0] = int_to_bcd(year)
-            dt_bytes[1] = int_to_bcd(month)
-            dt_bytes[2] = int_to_bcd(day)
-            dt_bytes[3] = int_to_bcd(hour)
-            dt_bytes[4] = int_to_bcd(minute)
-            dt_bytes[5] = int_to_bcd(second)
-            dt_bytes[6] = ms_high
-            dt_bytes[7] = ms_low
+            dt_bytes = encode_datetime(datetime.datetime.now())
             db_buffer[offset:offset+8] = dt_bytes
             logger.info(f"{COLOR_DATETIME}Wrote S7 DT: {' '.join(f'{b:02X}' for b in dt_bytes)} to {dp['address']['address_string']}{COLOR_RESET}")
-        time.sleep(FREQUENCY)
+        time.sleep(frequency)
 
 # ---------------------- Monitoring Threads ----------------------
-def monitor_status():
+def monitor_status(server):
     while True:
         try:
             status, cpu, clients = server.get_status()
@@ -237,7 +238,7 @@ def monitor_status():
             logger.error(f"Status error: {e}")
         time.sleep(5)
 
-def monitor_events():
+def monitor_events(server):
     while True:
         try:
             event = server.pick_event()
@@ -249,17 +250,37 @@ def monitor_events():
         time.sleep(1)
 
 # ---------------------- Main Startup Process ----------------------
-def start_server():
+def start_server(server, address, port, rack, slot):
     try:
         server.start()
-        logger.info(f"Snap7 server started at {ADDRESS}:{PORT} rack={RACK} slot={SLOT}")
+        logger.info(f"Snap7 server started at {address}:{port} rack={rack} slot={slot}")
     except Exception as e:
         logger.error(f"Server start error: {e}")
         raise
 
 
-def main():
-    start_server()
+def main(args):
+    setup_logging()
+    s7_cfg = load_s7_classic_config(args.config_path)
+    conn = get_connection(s7_cfg)
+    if not conn:
+        raise RuntimeError("No connections found in s7_classic_connection.json")
+    params = conn.get("parameters", {})
+    datapoints = conn.get("datapoints", [])
+
+    # Parameter priority: Environment variable > Config file > Default value
+    address = get_config_param("ip_address", "S7SERVER_ADDRESS", params, "0.0.0.0")
+    port = int(get_config_param("port", "S7SERVER_PORT", params, 102))
+    rack = int(get_config_param("rack_number", "S7SERVER_RACK", params, 0))
+    slot = int(get_config_param("slot_number", "S7SERVER_SLOT", params, 2))
+    frequency = float(get_config_param("frequency", "S7SERVER_FREQUENCY", params, 1))
+
+    # ---------------------- S7 Server Initialization ----------------------
+    server = Server()
+    db_buffer = ctypes.create_string_buffer(calc_db_size(datapoints))
+    server.register_area(SrvArea.DB, DB_NUMBER, db_buffer)
+
+    start_server(server, address, port, rack, slot)
     # Categorize datapoints
     bool_points = [dp for dp in datapoints if dp["data_type"] == "Bool"]
     int_points = [dp for dp in datapoints if dp["data_type"] == "Int"]
@@ -267,19 +288,19 @@ def main():
     string_points = [dp for dp in datapoints if dp["data_type"] == "String"]
     datetime_points = [dp for dp in datapoints if dp["data_type"] == "DateTime"]
 
-    if bool_points:
-        threading.Thread(target=write_bool_points, args=(bool_points,), daemon=True).start()
-    if int_points:
-        threading.Thread(target=write_int_points, args=(int_points,), daemon=True).start()
-    if real_points:
-        threading.Thread(target=write_real_points, args=(real_points,), daemon=True).start()
-    if string_points:
-        threading.Thread(target=write_string_points, args=(string_points,), daemon=True).start()
-    if datetime_points:
-        threading.Thread(target=write_datetime_points, args=(datetime_points,), daemon=True).start()
-
-    threading.Thread(target=monitor_status, daemon=True).start()
-    threading.Thread(target=monitor_events, daemon=True).start()
+    writers = [
+        (write_bool_points, bool_points),
+        (write_int_points, int_points),
+        (write_real_points, real_points),
+        (write_string_points, string_points),
+        (write_datetime_points, datetime_points),
+    ]
+    for target, points in writers:
+        if points:
+            threading.Thread(target=target, args=(points, db_buffer, frequency), daemon=True).start()
+
+    threading.Thread(target=monitor_status, args=(server,), daemon=True).start()
+    threading.Thread(target=monitor_events, args=(server,), daemon=True).start()
     try:
         while True:
             time.sleep(1)
@@ -351,8 +372,9 @@ To show this help:
     print(help_text)
 
 if __name__ == "__main__":
+    args = parse_args()
     if args.help:
         print_help()
     else:
-        main()
+        main(args)
 
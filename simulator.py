@@ -0,0 +1,382 @@
+import os
+import logging
+import threading
+import time
+import random
+import ctypes
+import struct
+import datetime
+import argparse
+from snap7.server import Server as S7Server
+from snap7 import SrvArea
+from opcua import Server as UaServer
+from opcua import ua
+from opcuaserver import parse_xml_config, random_value
+from s7server import (
+    DB_NUMBER,
+    calc_db_size,
+    datapoint_size,
+    encode_datetime,
+    encode_string,
+    find_default_file,
+    get_config_param,
+    get_connection,
+    load_s7_classic_config,
+    monitor_events,
+    monitor_status,
+    parse_address,
+    setup_logging,
+    start_server,
+)
+
+# ---------------------- Configuration ----------------------
+def parse_args():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-s', '--s7-file', dest='s7_config_path', help='Path to S7 config file')
+    parser.add_argument('-u', '--opcua-file', dest='opcua_config_path', help='Path to OPC UA XML model')
+    parser.add_argument('--help', action='store_true', help='Show help')
+    args, unknown = parser.parse_known_args()
+    return args
+
+
+DEFAULT_UA_MODEL = "opc_ua_test_model.xml"
+DEFAULT_UA_ENDPOINT = "opc.tcp://0.0.0.0:4840/freeopcua/server/"
+DEFAULT_UA_NAMESPACE = "http://examples.org/s7simulator/"
+
+# OPC UA data types a S7 datapoint may be published to. Values are always
+# generated from the S7 type so both protocols carry exactly the same value.
+S7_UA_TYPES = {
+    "Bool": ("Boolean",),
+    "Int": ("Int16", "UInt16", "Int32", "UInt32", "Int64", "UInt64"),
+    "Real": ("Float", "Double"),
+    "String": ("String",),
+    "DateTime": ("DateTime",),
+}
+# S7 Int is written as an unsigned word, Int16 can only hold its lower half
+S7_INT_MAX = {"Int16": 32767}
+
+
+def ua_type_name(dtype):
+    # Normalize 'i=4' style ids to the alias names used by the XML models.
+    # DataType and VariantType ids only agree for the builtin types 1..21.
+    if dtype.startswith('i='):
+        try:
+            type_id = int(dtype[2:])
+        except ValueError:
+            return dtype
+        if 1 <= type_id <= 21:
+            return ua.VariantType(type_id).name
+    return dtype
+
+# ---------------------- Logging Configuration ----------------------
+
+# Child of the s7server logger, so setup_logging() configures both
+logger = logging.getLogger("s7server.simulator")
+
+# ---------------------- Tag Model ----------------------
+def place_datapoint(occupied, area_type, byte_offset, bit_offset, size):
+    """Reserve the DB bytes of a datapoint, return False if they overlap.
+
+    occupied maps a byte offset to the set of DBX bits using it, or to None
+    when the whole byte belongs to one datapoint.
+    """
+    if area_type == "DBX" and bit_offset is not None:
+        bits = occupied.get(byte_offset, set())
+        if bits is None or bit_offset in bits:
+            return False
+        occupied[byte_offset] = bits | {bit_offset}
+        return True
+    byte_range = range(byte_offset, byte_offset + size)
+    if any(b in occupied for b in byte_range):
+        return False
+    for b in byte_range:
+        occupied[b] = None
+    return True
+
+
+def build_tags(datapoints, variables):
+    """Merge S7 datapoints and OPC UA variables into one list of tags.
+
+    An OPC UA variable is linked to the S7 datapoint whose "opcua_name" (or
+    "name") equals its DisplayName; a linked tag is generated once per tick
+    and published to both servers. Everything else is served by one protocol.
+    """
+    tags = []
+    by_name = {}
+    occupied = {}
+    for dp in datapoints:
+        addr_str = dp["address"]["address_string"]
+        _, area_type, byte_offset, bit_offset = parse_address(addr_str)
+        size = datapoint_size(area_type, dp["data_type"])
+        if not place_datapoint(occupied, area_type, byte_offset, bit_offset, size):
+            logger.warning(f"Skipping S7 {dp.get('name', '')} at {addr_str}: overlaps another datapoint")
+            continue
+        s7_type = dp["data_type"]
+        if area_type == "DBX":
+            s7_type = "Bool"
+        tag = {
+            "name": dp.get("name", addr_str),
+            "s7_type": s7_type,
+            "address": addr_str,
+            "offset": byte_offset,
+            "bit": bit_offset if area_type == "DBX" else None,
+            "ua_name": None,
+            "ua_type": None,
+            "ua_node": None,
+        }
+        tags.append(tag)
+        by_name.setdefault(dp.get("opcua_name") or tag["name"], tag)
+
+    for v in variables:
+        ua_type = ua_type_name(v['dtype'])
+        tag = by_name.get(v['name'])
+        if tag is not None and tag["ua_type"] is None:
+            if ua_type in S7_UA_TYPES.get(tag["s7_type"], ()):
+                tag["ua_name"] = v['name']
+                tag["ua_type"] = ua_type
+                continue
+            logger.warning(f"Cannot link OPC UA {v['name']} ({ua_type}) to S7 {tag['address']} ({tag['s7_type']})")
+        tags.append({
+            "name": v['name'],
+            "s7_type": None,
+            "address": None,
+            "offset": None,
+            "bit": None,
+            "ua_name": v['name'],
+            "ua_type": ua_type,
+            "ua_node": None,
+        })
+    return tags
+
+# ---------------------- Value Generation ----------------------
+def to_real(value):
+    # Round through float32 so OPC UA reports what the S7 DB holds
+    return struct.unpack('>f', struct.pack('>f', value))[0]
+
+
+def generate_value(tag, now):
+    s7_type = tag["s7_type"]
+    if s7_type is None:
+        return random_value(tag["ua_type"])
+    if s7_type == "Bool":
+        return random.choice([True, False])
+    if s7_type == "Int":
+        return random.randint(0, S7_INT_MAX.get(tag["ua_type"], 65535))
+    if s7_type == "Real":
+        return to_real(random.uniform(0, 100))
+    if s7_type == "String":
+        return f"Hello_{random.randint(100,999)}"
+    if s7_type == "DateTime":
+        # S7 DT has millisecond resolution
+        return now.replace(microsecond=now.microsecond // 1000 * 1000)
+    return 0
+
+
+def generate_values(tags):
+    # Timezone-aware local time: S7 DT gets the wall clock, OPC UA gets UTC
+    now = datetime.datetime.now().astimezone()
+    return [generate_value(tag, now) for tag in tags], now
+
+# ---------------------- S7 Publishing ----------------------
+def write_s7_values(db_buffer, tags, values):
+    for tag, value in zip(tags, values):
+        s7_type = tag["s7_type"]
+        if s7_type is None:
+            continue
+        offset = tag["offset"]
+        if s7_type == "Bool":
+            if tag["bit"] is not None:
+                mask = 1 << tag["bit"]
+                current = db_buffer[offset][0]
+                db_buffer[offset] = (current | mask) if value else (current & ~mask & 0xFF)
+            else:
+                db_buffer[offset] = 1 if value else 0
+        elif s7_type == "Int":
+            db_buffer[offset:offset+2] = value.to_bytes(2, byteorder='big')
+        elif s7_type == "Real":
+            db_buffer[offset:offset+4] = struct.pack('>f', value)
+        elif s7_type == "String":
+            db_buffer[offset:offset+20] = encode_string(value)
+        elif s7_type == "DateTime":
+            # S7 DT has no time zone and carries local wall time
+            db_buffer[offset:offset+8] = encode_datetime(value)
+
+# ---------------------- OPC UA Publishing ----------------------
+def to_ua_datetime(dt):
+    # python-opcua treats naive datetimes as UTC
+    return dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def make_variant(tag, value):
+    if tag["s7_type"] is None:
+        # Same behaviour as opcuaserver.py: let the variant type be guessed
+        return ua.Variant(value)
+    if tag["ua_type"] == "DateTime":
+        value = to_ua_datetime(value)
+    return ua.Variant(value, getattr(ua.VariantType, tag["ua_type"]))
+
+
+def write_ua_values(ua_server, tags, values, now):
+    # One batched Write request per tick instead of one set_value() per node
+    params = ua.WriteParameters()
+    source_ts = to_ua_datetime(now)
+    for tag, value in zip(tags, values):
+        if tag["ua_node"] is None:
+            continue
+        dv = ua.DataValue(make_variant(tag, value))
+        dv.SourceTimestamp = source_ts
+        wv = ua.WriteValue()
+        wv.NodeId = tag["ua_node"].nodeid
+        wv.AttributeId = ua.AttributeIds.Value
+        wv.Value = dv
+        params.NodesToWrite.append(wv)
+    if not params.NodesToWrite:
+        return
+    results = ua_server.iserver.isession.write(params)
+    bad = sum(1 for r in results if not r.is_good())
+    if bad:
+        logger.warning(f"OPC UA batch write: {bad}/{len(results)} nodes rejected")
+
+# ---------------------- Main Startup Process ----------------------
+def main(args):
+    setup_logging()
+    # Bundled default files are only used when no file was given at all,
+    # so passing just -s or just -u runs a single protocol
+    use_defaults = not args.s7_config_path and not args.opcua_config_path
+    s7_cfg = load_s7_classic_config(args.s7_config_path) if args.s7_config_path or use_defaults else {}
+    conn = get_connection(s7_cfg)
+    params = conn.get("parameters", {})
+    datapoints = conn.get("datapoints", [])
+
+    ua_config_path = args.opcua_config_path or (find_default_file(DEFAULT_UA_MODEL) if use_defaults else None)
+    if ua_config_path and not os.path.isfile(ua_config_path):
+        raise RuntimeError(f"Config file not found: {ua_config_path}")
+    variables, ns_uri = parse_xml_config(ua_config_path) if ua_config_path else ([], None)
+
+    if not datapoints and not variables:
+        raise RuntimeError("No S7 datapoints or OPC UA variables found")
+
+    # Parameter priority: Environment variable > Config file > Default value
+    address = get_config_param("ip_address", "S7SERVER_ADDRESS", params, "0.0.0.0")
+    port = int(get_config_param("port", "S7SERVER_PORT", params, 102))
+    rack = int(get_config_param("rack_number", "S7SERVER_RACK", params, 0))
+    slot = int(get_config_param("slot_number", "S7SERVER_SLOT", params, 2))
+    frequency = float(get_config_param("frequency", "S7SERVER_FREQUENCY", params, 1))
+    endpoint = os.environ.get("OPCUA_ENDPOINT") or DEFAULT_UA_ENDPOINT
+
+    tags = build_tags(datapoints, variables)
+    linked = sum(1 for tag in tags if tag["s7_type"] and tag["ua_type"])
+    logger.info(f"Tag model: {len(tags)} tags, {linked} shared by S7 and OPC UA")
+    values, now = generate_values(tags)
+
+    s7_server = None
+    db_buffer = None
+    if datapoints:
+        s7_server = S7Server()
+        db_buffer = ctypes.create_string_buffer(calc_db_size(datapoints))
+        s7_server.register_area(SrvArea.DB, DB_NUMBER, db_buffer)
+        write_s7_values(db_buffer, tags, values)
+
+    ua_server = None
+    if any(tag["ua_type"] for tag in tags):
+        ua_server = UaServer()
+        ua_server.set_endpoint(endpoint)
+        idx = ua_server.register_namespace(ns_uri if ns_uri else DEFAULT_UA_NAMESPACE)
+        objects = ua_server.get_objects_node()
+        for tag, value in zip(tags, values):
+            if tag["ua_type"] is None:
+                continue
+            variant = make_variant(tag, value)
+            var = objects.add_variable(idx, tag["ua_name"], variant.Value, variant.VariantType)
+            var.set_writable()
+            tag["ua_node"] = var
+
+    if s7_server:
+        start_server(s7_server, address, port, rack, slot)
+        threading.Thread(target=monitor_status, args=(s7_server,), daemon=True).start()
+        threading.Thread(target=monitor_events, args=(s7_server,), daemon=True).start()
+    if ua_server:
+        ua_server.start()
+        logger.info(f"OPC UA server started at {endpoint}")
+
+    next_tick = time.monotonic()
+    try:
+        while True:
+            next_tick += frequency
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+            values, now = generate_values(tags)
+            if s7_server:
+                s7_server.lock_area(SrvArea.DB, DB_NUMBER)
+                try:
+                    write_s7_values(db_buffer, tags, values)
+                finally:
+                    s7_server.unlock_area(SrvArea.DB, DB_NUMBER)
+            if ua_server:
+                write_ua_values(ua_server, tags, values, now)
+            logger.info(f"Published {len(tags)} tags at {now.isoformat(timespec='milliseconds')}")
+    except KeyboardInterrupt:
+        logger.info("Stopping servers...")
+    finally:
+        if ua_server:
+            ua_server.stop()
+        if s7_server:
+            s7_server.stop()
+            s7_server.destroy()
+        logger.info("Servers stopped.")
+
+
+def print_help():
+    help_text = """
+S7 + OPC UA Simulator Help
+
+Usage:
+    python simulator.py [-s s7_config.json] [-u opc_ua_model.xml] [--help]
+
+Configuration:
+    S7 datapoints are read from the file given with -s and OPC UA variables
+    from the file given with -u; give only one of them to run a single protocol.
+    Without either option 's7_classic_connection.json' and 'opc_ua_test_model.xml'
+    are looked up in the current or script directory.
+    The formats are the same as for s7server.py and opcuaserver.py.
+
+    Both configs are loaded into one tag model and every tag is generated once
+    per tick. An OPC UA variable whose DisplayName equals the "name" of a S7
+    datapoint (or its optional "opcua_name" field) is linked to it, and both
+    servers publish the identical value. Compatible types are:
+        Bool -> Boolean
+        Int -> Int16, UInt16, Int32, UInt32, Int64, UInt64
+        Real -> Float, Double
+        String -> String
+        DateTime -> DateTime
+    S7 DateTime (DT) has no time zone and carries local wall time, OPC UA
+    DateTime carries the same instant in UTC.
+
+    S7 datapoints overlapping bytes of an earlier datapoint are skipped, only
+    DBX bits of the same byte may share it.
+
+    The tick interval is the S7 "frequency" parameter (seconds, default 1).
+
+    You can override parameters using environment variables:
+        S7SERVER_ADDRESS, S7SERVER_PORT, S7SERVER_RACK, S7SERVER_SLOT, S7SERVER_FREQUENCY, S7SERVER_LOG
+        OPCUA_ENDPOINT (default opc.tcp://0.0.0.0:4840/freeopcua/server/)
+
+    Log output defaults to stdout, or set S7SERVER_LOG to a file path.
+
+To start the simulator:
+    python simulator.py -s testconfig/config.json -u testconfig/opc_ua_test_model.xml
+
+To show this help:
+    python simulator.py --help
+"""
+    print(help_text)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.help:
+        print_help()
+    else:
+        main(args)
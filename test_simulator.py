@@ -0,0 +1,87 @@
+import ctypes
+import datetime
+
+from simulator import build_tags, generate_value, make_variant, ua_type_name, write_s7_values
+
+
+def dp(name, address, data_type, opcua_name=None):
+    point = {"name": name, "address": {"address_string": address}, "data_type": data_type}
+    if opcua_name:
+        point["opcua_name"] = opcua_name
+    return point
+
+
+def test_build_tags_links_by_name_and_opcua_name():
+    tags = build_tags(
+        [dp("Real1", "%DB1.DBD0", "Real"), dp("Bool1", "%DB1.DBB4", "Bool", opcua_name="maxLevel")],
+        [{"name": "Real1", "dtype": "Float"}, {"name": "maxLevel", "dtype": "i=1"}, {"name": "other", "dtype": "String"}],
+    )
+    assert [(t["name"], t["s7_type"], t["ua_name"], t["ua_type"]) for t in tags] == [
+        ("Real1", "Real", "Real1", "Float"),
+        ("Bool1", "Bool", "maxLevel", "Boolean"),
+        ("other", None, "other", "String"),
+    ]
+
+
+def test_build_tags_type_mismatch_is_not_linked():
+    tags = build_tags([dp("Int1", "%DB1.DBW0", "Int")], [{"name": "Int1", "dtype": "Float"}])
+    assert [(t["s7_type"], t["ua_type"]) for t in tags] == [("Int", None), (None, "Float")]
+
+
+def test_build_tags_skips_overlapping_datapoints():
+    tags = build_tags(
+        [
+            dp("Bool1", "%DB1.DBB0", "Bool"),
+            dp("Bit0.6", "%DB1.DBX0.6", "Bool"),
+            dp("Int1", "%DB1.DBW1", "Int"),
+            dp("Real1", "%DB1.DBD2", "Real"),
+            dp("Bit4.0", "%DB1.DBX4.0", "Bool"),
+            dp("Bit4.1", "%DB1.DBX4.1", "Bool"),
+            dp("Bit4.1b", "%DB1.DBX4.1", "Bool"),
+            dp("Bool4", "%DB1.DBB4", "Bool"),
+        ],
+        [],
+    )
+    assert [t["name"] for t in tags] == ["Bool1", "Int1", "Bit4.0", "Bit4.1"]
+
+
+def test_int16_link_limits_s7_int_range():
+    tags = build_tags(
+        [dp("Int1", "%DB1.DBW0", "Int", opcua_name="tag1"), dp("Int2", "%DB1.DBW2", "Int", opcua_name="tag2")],
+        [{"name": "tag1", "dtype": "Int16"}, {"name": "tag2", "dtype": "UInt16"}],
+    )
+    now = datetime.datetime.now().astimezone()
+    assert max(generate_value(tags[0], now) for _ in range(2000)) <= 32767
+    assert max(generate_value(tags[1], now) for _ in range(2000)) > 32767
+
+
+def test_ua_type_name_only_maps_builtin_ids():
+    assert ua_type_name("i=4") == "Int16"
+    assert ua_type_name("i=21") == "LocalizedText"
+    assert ua_type_name("i=22") == "i=22"
+    assert ua_type_name("i=24") == "i=24"
+    assert ua_type_name("Float") == "Float"
+
+
+def test_write_s7_values_packs_bits():
+    tags = build_tags(
+        [dp("Bit0", "%DB1.DBX3.0", "Bool"), dp("Bit6", "%DB1.DBX3.6", "Bool"), dp("Bool1", "%DB1.DBB0", "Bool")],
+        [],
+    )
+    db_buffer = ctypes.create_string_buffer(4)
+    write_s7_values(db_buffer, tags, [True, True, True])
+    assert db_buffer.raw == b"\x01\x00\x00\x41"
+    write_s7_values(db_buffer, tags, [True, False, False])
+    assert db_buffer.raw == b"\x00\x00\x00\x01"
+
+
+def test_linked_datetime_is_local_in_s7_and_utc_in_opcua():
+    tags = build_tags([dp("Dt1", "%DB1.DBB0", "DateTime")], [{"name": "Dt1", "dtype": "DateTime"}])
+    tz = datetime.timezone(datetime.timedelta(hours=8))
+    now = datetime.datetime(2024, 11, 25, 16, 53, 45, 123456, tzinfo=tz)
+    value = generate_value(tags[0], now)
+    db_buffer = ctypes.create_string_buffer(8)
+    write_s7_values(db_buffer, tags, [value])
+    # 2024-11-25 16:53:45.123, Monday
+    assert db_buffer.raw == bytes([0x24, 0x11, 0x25, 0x16, 0x53, 0x45, 0x12, 0x32])
+    assert make_variant(tags[0], value).Value == datetime.datetime(2024, 11, 25, 8, 53, 45, 123000)